@@ -1,9 +1,21 @@
 import os
+import re
+import asyncio
+import hashlib
+import shutil
+import aiohttp
 import requests
 import pdfplumber
+import pypdfium2 as pdfium
 import feedparser
 import urllib.parse
-from typing import TypedDict, List, Callable
+import math
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from contextvars import ContextVar
+from requests.adapters import HTTPAdapter, Retry
+from typing import TypedDict, List, Callable, Optional
 from langgraph.graph import StateGraph, END
 from langchain_ollama import ChatOllama
 from langchain_core.callbacks.base import BaseCallbackHandler
@@ -15,108 +27,390 @@ class AgentState(TypedDict):
     query: str
     papers: List[dict]
     pdf_path: str
+    pdf_paper: dict
     extracted_text: str
     answer: str
-
-llm = ChatOllama(model="llama3", temperature=0.0)
-
-def search_papers(state: AgentState, callback: Callable[[str], None] = lambda msg: None) -> dict:
-    query = state["query"]
-    api_key = os.getenv("CORE_API_KEY")
-    papers = []
-
-    callback(f"🔍 Searching CORE API for: {query}")
+    summaries: List[str]
+
+# keep_alive stops Ollama from unloading the model after its 5-minute
+# idle default, which would cost multi-second reloads on the next request.
+llm = ChatOllama(
+    model="llama3",
+    temperature=0.0,
+    keep_alive="1h",
+    num_ctx=4096,
+    num_predict=512,
+)
+
+def warm_up_llm():
+    """Issue a trivial completion so the first real request isn't the cold one."""
     try:
-        url = "https://api.core.ac.uk/v3/search/works/"
-        response = requests.get(url, params={"q": query, "apiKey": api_key}, timeout=10)
-        data = response.json()
-        papers = data.get("results") or data.get("data") or []
-        if papers:
-            callback(f"✅ Found {len(papers)} papers from CORE API")
-            return {"papers": papers}
-        callback("⚠️ No CORE papers found, trying arXiv...")
-    except Exception as e:
-        callback(f"❌ CORE API failed: {e}")
-
-    callback(f"🔍 Searching arXiv for: {query}")
-    arxiv_url = "http://export.arxiv.org/api/query"
+        llm.invoke("ok")
+    except Exception:
+        pass
+
+# Plain session for PDF bodies: CachedSession buffers the entire
+# response at .get() time, which defeats stream=True — the 1KB probes
+# and the 64KB chunked writes rely on real streaming.
+_session = requests.Session()
+_adapter = HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=16,
+    max_retries=Retry(total=2, backoff_factor=0.3),
+)
+_session.mount("http://", _adapter)
+_session.mount("https://", _adapter)
+_session.headers["User-Agent"] = "multi-source-paper-summarizer"
+
+CORE_URL = "https://api.core.ac.uk/v3/search/works/"
+ARXIV_URL = "http://export.arxiv.org/api/query"
+
+async def _query_core(session: "aiohttp.ClientSession", query: str) -> List[dict]:
+    api_key = os.getenv("CORE_API_KEY")
+    # aiohttp rejects None param values, so only send the key when set.
+    params = {"q": query}
+    if api_key:
+        params["apiKey"] = api_key
+    async with session.get(CORE_URL, params=params) as response:
+        data = await response.json()
+    return data.get("results") or data.get("data") or []
+
+async def _query_arxiv(session: "aiohttp.ClientSession", query: str) -> List[dict]:
     encoded_query = urllib.parse.quote(query)
-    feed = feedparser.parse(f"{arxiv_url}?search_query=all:{encoded_query}&start=0&max_results=5")
-    entries = feed.entries
+    url = f"{ARXIV_URL}?search_query=all:{encoded_query}&start=0&max_results=5"
+    async with session.get(url) as response:
+        response.raise_for_status()
+        body = await response.read()
 
-    if not entries:
-        raise Exception("No papers found on CORE or arXiv.")
+    loop = asyncio.get_running_loop()
+    feed = await loop.run_in_executor(None, feedparser.parse, body)
 
-    for entry in entries:
+    papers = []
+    for entry in feed.entries:
         pdf_link = next((link.href for link in entry.links if link.type == "application/pdf"), None)
         papers.append({
             "title": entry.title,
             "description": entry.summary,
             "pdf_url": pdf_link,
         })
+    return papers
+
+async def _search_both(query: str):
+    timeout = aiohttp.ClientTimeout(total=10)
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        return await asyncio.gather(
+            _query_core(session, query),
+            _query_arxiv(session, query),
+            return_exceptions=True,
+        )
+
+def _run_async(coro):
+    """Run a coroutine from sync code, even if this thread already hosts a loop."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        return pool.submit(asyncio.run, coro).result()
 
-    callback(f"✅ Found {len(papers)} papers from arXiv")
-    return {"papers": papers}
+def search_papers(state: AgentState, callback: Callable[[str], None] = lambda msg: None) -> dict:
+    query = state["query"]
 
-def download_pdf(state: AgentState, callback: Callable[[str], None] = lambda msg: None) -> dict:
-    import mimetypes
+    callback(f"🔍 Searching CORE API and arXiv for: {query}")
+    core_papers, arxiv_papers = _run_async(_search_both(query))
 
+    if isinstance(core_papers, Exception):
+        callback(f"❌ CORE API failed: {core_papers}")
+    elif core_papers:
+        callback(f"✅ Found {len(core_papers)} papers from CORE API")
+        return {"papers": core_papers}
+    else:
+        callback("⚠️ No CORE papers found, falling back to arXiv...")
+
+    if isinstance(arxiv_papers, Exception):
+        callback(f"❌ arXiv failed: {arxiv_papers}")
+        arxiv_papers = []
+
+    if not arxiv_papers:
+        raise Exception("No papers found on CORE or arXiv.")
+
+    callback(f"✅ Found {len(arxiv_papers)} papers from arXiv")
+    return {"papers": arxiv_papers}
+
+def _url_from_open_access(paper: dict) -> Optional[str]:
+    info = paper.get("openAccessPdf")
+    return info.get("url") if info else None
+
+def _url_from_pdf_url(paper: dict) -> Optional[str]:
+    return paper.get("pdf_url")
+
+def _url_from_links(paper: dict) -> Optional[str]:
+    links = paper.get("links") or []
+    return next((link.get("url") for link in links if link.get("type") == "download"), None)
+
+def _url_from_source_fulltext(paper: dict) -> Optional[str]:
+    urls = paper.get("sourceFulltextUrls")
+    if isinstance(urls, list) and urls:
+        return urls[0]
+    return None
+
+# Tried in order; first non-empty hit wins.
+_URL_RESOLVERS = (
+    _url_from_open_access,
+    _url_from_pdf_url,
+    _url_from_links,
+    _url_from_source_fulltext,
+)
+
+def resolve_pdf_url(paper: dict) -> Optional[str]:
+    url = next(filter(None, (resolver(paper) for resolver in _URL_RESOLVERS)), None)
+    if url and "arxiv.org/abs/" in url:
+        url = url.replace("arxiv.org/abs/", "arxiv.org/pdf/") + ".pdf"
+    return url
+
+# Validated PDFs cached on disk by URL, so repeat queries skip the
+# download entirely. Only winners that passed the parse-size gate are
+# stored, keeping growth bounded to ~50MB per distinct paper.
+_PDF_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pdf_cache")
+os.makedirs(_PDF_CACHE_DIR, exist_ok=True)
+
+def _pdf_cache_path(url: str) -> str:
+    return os.path.join(_PDF_CACHE_DIR, hashlib.sha256(url.encode()).hexdigest() + ".pdf")
+
+def _probe_pdf(paper: dict):
+    """Open the paper's PDF URL and verify the first bytes look like a PDF.
+
+    Reads only the first 1KB of the body; the rest is left unfetched for
+    the winning probe to stream. Returns (paper, url, response, first_chunk)
+    with the response still streaming, (paper, url, None, b"") when the URL
+    is already in the on-disk cache, or None if the paper has no
+    downloadable URL.
+    """
+    url = resolve_pdf_url(paper)
+    if not url:
+        return None
+    if os.path.exists(_pdf_cache_path(url)):
+        # Cached hit: no response to stream, download_pdf copies from disk.
+        return paper, url, None, b""
+    response = _session.get(url, stream=True, timeout=(5, 30))
+    try:
+        response.raise_for_status()
+        # Bytes beyond the parse limit can never be used (neither parsed
+        # nor cached), so reject oversized bodies before pulling any.
+        content_length = response.headers.get('Content-Length')
+        if content_length and int(content_length) > _MAX_PARSE_BYTES:
+            raise Exception(f"PDF too large to parse ({content_length} bytes)")
+        first_chunk = next(response.iter_content(1024), b"")
+        if 'application/pdf' not in response.headers.get('Content-Type', '') and not first_chunk.startswith(b'%PDF'):
+            raise Exception("Not a valid PDF file")
+    except Exception:
+        response.close()
+        raise
+    return paper, url, response, first_chunk
+
+def _close_probe(future):
+    if future.cancelled() or future.exception():
+        return
+    result = future.result()
+    if result and result[2] is not None:
+        result[2].close()
+
+def download_pdf(state: AgentState, callback: Callable[[str], None] = lambda msg: None) -> dict:
     papers = state["papers"]
+    callback(f"📄 Probing {len(papers)} papers for a downloadable PDF...")
 
-    for idx, paper in enumerate(papers):
-        title = paper.get("title", "No title")
-        callback(f"📄 Checking paper {idx+1}: {title}")
-        
-        url = None
-        if "openAccessPdf" in paper and paper["openAccessPdf"]:
-            url = paper["openAccessPdf"].get("url")
-        if not url and "pdf_url" in paper:
-            url = paper["pdf_url"]
-        if not url and "links" in paper:
-            download_links = [link.get("url") for link in paper["links"] if link.get("type") == "download"]
-            if download_links:
-                url = download_links[0]
-        if not url and "sourceFulltextUrls" in paper:
-            if isinstance(paper["sourceFulltextUrls"], list) and paper["sourceFulltextUrls"]:
-                url = paper["sourceFulltextUrls"][0]
-
-        if url and "arxiv.org/abs/" in url:
-            url = url.replace("arxiv.org/abs/", "arxiv.org/pdf/") + ".pdf"
-
-        if url:
-            callback(f"🔗 Found PDF URL: {url}")
+    executor = ThreadPoolExecutor(max_workers=8)
+    winner = None
+    futures = [executor.submit(_probe_pdf, paper) for paper in papers]
+    try:
+        for future in as_completed(futures):
             try:
-                response = requests.get(url, timeout=10)
-                response.raise_for_status()
-                if 'application/pdf' not in response.headers.get('Content-Type', '') and not response.content.startswith(b'%PDF'):
-                    raise Exception("Not a valid PDF file")
-                path = "temp.pdf"
-                with open(path, "wb") as f:
-                    f.write(response.content)
-                callback("✅ Valid PDF successfully downloaded.")
-                return {"pdf_path": path}
+                result = future.result()
             except Exception as e:
                 callback(f"❌ Error downloading or validating PDF: {e}")
-        else:
-            callback("⚠️ No downloadable PDF URL found.")
-
-    callback("⚠️ No valid PDF found in any fallback. Will use abstract instead.")
-    return {}
+                continue
+            if result is None:
+                callback("⚠️ No downloadable PDF URL found.")
+                continue
+            winner = result
+            futures.remove(future)
+            break
+    finally:
+        for future in futures:
+            future.cancel()
+            future.add_done_callback(_close_probe)
+        executor.shutdown(wait=False)
+
+    if not winner:
+        callback("⚠️ No valid PDF found in any fallback. Will use abstract instead.")
+        return {}
+
+    paper, url, response, first_chunk = winner
+    # Per-request temp file so concurrent requests never clobber each
+    # other's download; run_agent removes it once the pipeline finishes.
+    fd, path = tempfile.mkstemp(suffix=".pdf")
+    temp_pdfs = _temp_pdfs_var.get()
+    if temp_pdfs is not None:
+        temp_pdfs.append(path)
+
+    if response is None:
+        callback(f"⚡ Using cached PDF for: {url}")
+        os.close(fd)
+        shutil.copyfile(_pdf_cache_path(url), path)
+        return {"pdf_path": path, "pdf_paper": paper}
+
+    callback(f"🔗 Found PDF URL: {url}")
+    try:
+        written = len(first_chunk)
+        with os.fdopen(fd, "wb") as f:
+            f.write(first_chunk)
+            for chunk in response.iter_content(64 * 1024):
+                written += len(chunk)
+                if written > _MAX_PARSE_BYTES:
+                    # Abort the transfer as soon as the parse limit is
+                    # exceeded — no point streaming bytes we will discard.
+                    raise Exception(f"PDF exceeds the {_MAX_PARSE_BYTES} byte parse limit mid-download")
+                f.write(chunk)
+        # Store the validated body in the URL-keyed cache; write-then-replace
+        # keeps concurrent downloads of the same paper from seeing a torn file.
+        try:
+            cache_fd, cache_tmp = tempfile.mkstemp(dir=_PDF_CACHE_DIR, suffix=".part")
+            os.close(cache_fd)
+            shutil.copyfile(path, cache_tmp)
+            os.replace(cache_tmp, _pdf_cache_path(url))
+        except OSError:
+            pass
+        callback("✅ Valid PDF successfully downloaded.")
+        return {"pdf_path": path, "pdf_paper": paper}
+    except Exception as e:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        callback(f"❌ Error downloading or validating PDF: {e}")
+        callback("⚠️ No valid PDF found in any fallback. Will use abstract instead.")
+        return {}
+    finally:
+        response.close()
+
+# summarize_text only feeds this many characters to the LLM; extraction
+# stops at twice that to absorb shrinkage from strip/cleanup.
+_PROMPT_CHAR_BUDGET = 2000
+_EXTRACT_CHAR_BUDGET = 2 * _PROMPT_CHAR_BUDGET
+
+# Parsing bounds: scanned archives can take minutes in pdfminer-based
+# stacks, so oversized documents fall back to the abstract path and
+# page iteration is capped either way.
+_MAX_PARSE_BYTES = 50 * 1024 * 1024
+_MAX_PARSE_PAGES = 200
+
+# An abstract at least this long is summarized directly, skipping the
+# download and extract stages.
+_MIN_ABSTRACT_CHARS = 1000
+
+_RE_SINGLE_NL = re.compile(r"(?<!\n)\n(?!\n)")
+_RE_HYPHEN_NL = re.compile(r"-\n")
+_RE_FIGTBL = re.compile(r"Figure\s+\d+|Table\s+\d+", re.IGNORECASE)
+
+def _clean_page_text(page_text: str) -> Optional[str]:
+    page_text = _RE_SINGLE_NL.sub(" ", page_text)
+    page_text = _RE_HYPHEN_NL.sub("", page_text)
+    if _RE_FIGTBL.search(page_text):
+        return None
+    return page_text
+
+def _extract_with_pdfium(pdf_path: str) -> str:
+    pages = []
+    total = 0
+    pdf = pdfium.PdfDocument(pdf_path)
+    try:
+        for page_index in range(min(len(pdf), _MAX_PARSE_PAGES)):
+            page = pdf[page_index]
+            textpage = page.get_textpage()
+            n_chars = textpage.count_chars()
+            if n_chars == 0:
+                textpage.close()
+                page.close()
+                continue
+            # Peek at the first few hundred chars so figure/table pages are
+            # rejected without extracting (and cleaning) the whole page.
+            peek = textpage.get_text_range(index=0, count=min(300, n_chars))
+            if _RE_FIGTBL.search(peek):
+                textpage.close()
+                page.close()
+                continue
+            page_text = textpage.get_text_range()
+            textpage.close()
+            page.close()
+            if not page_text:
+                continue
+            page_text = _clean_page_text(page_text)
+            if page_text is None:
+                continue
+            pages.append(page_text)
+            total += len(page_text)
+            if total >= _EXTRACT_CHAR_BUDGET:
+                break
+    finally:
+        pdf.close()
+    return "\n".join(pages)
+
+# Below this page count, process-spawn cost outweighs the parallel speedup.
+_MIN_PAGES_FOR_POOL = 8
+
+def _extract_range_pdfplumber(pdf_path: str, start: int, end: int) -> str:
+    """Extract and clean pages [start, end) — runs in a worker process."""
+    pages = []
+    total = 0
+    with pdfplumber.open(pdf_path, pages=list(range(start + 1, end + 1))) as pdf:
+        for page in pdf.pages:
+            page_text = page.extract_text()
+            if not page_text:
+                continue
+            page_text = _clean_page_text(page_text)
+            if page_text is None:
+                continue
+            pages.append(page_text)
+            total += len(page_text)
+            if total >= _EXTRACT_CHAR_BUDGET:
+                break
+    return "\n".join(pages)
+
+def _extract_with_pdfplumber(pdf_path: str) -> str:
+    with pdfplumber.open(pdf_path) as pdf:
+        n_pages = min(len(pdf.pages), _MAX_PARSE_PAGES)
+
+    workers = min(os.cpu_count() or 1, n_pages)
+    if n_pages < _MIN_PAGES_FOR_POOL or workers < 2:
+        return _extract_range_pdfplumber(pdf_path, 0, n_pages)
+
+    chunk = math.ceil(n_pages / workers)
+    ranges = [(start, min(start + chunk, n_pages)) for start in range(0, n_pages, chunk)]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        parts = executor.map(
+            _extract_range_pdfplumber,
+            [pdf_path] * len(ranges),
+            [start for start, _ in ranges],
+            [end for _, end in ranges],
+        )
+        collected = []
+        total = 0
+        for part in parts:
+            if not part:
+                continue
+            collected.append(part)
+            total += len(part)
+            if total >= _EXTRACT_CHAR_BUDGET:
+                break
+        return "\n".join(collected)
 
 def extract_text(state: AgentState, callback: Callable[[str], None] = lambda msg: None) -> dict:
-    import re
-    text = ""
     try:
-        with pdfplumber.open(state["pdf_path"]) as pdf:
-            for page in pdf.pages:
-                page_text = page.extract_text()
-                if not page_text:
-                    continue
-                page_text = re.sub(r"(?<!\n)\n(?!\n)", " ", page_text)
-                page_text = re.sub(r"-\n", "", page_text)
-                if re.search(r"Figure\s+\d+|Table\s+\d+", page_text, re.IGNORECASE):
-                    continue
-                text += page_text + "\n"
+        try:
+            text = _extract_with_pdfium(state["pdf_path"])
+        except Exception:
+            callback("⚠️ PDFium extraction failed, falling back to pdfplumber...")
+            text = _extract_with_pdfplumber(state["pdf_path"])
     except Exception as e:
         callback("❌ PDF extraction failed")
         raise Exception("PDF parsing failed")
@@ -129,14 +423,23 @@ def extract_text(state: AgentState, callback: Callable[[str], None] = lambda msg
     return {"extracted_text": text}
 
 def summarize_text(state: AgentState, callback: Callable[[str], None] = lambda msg: None) -> dict:
-    content = state["extracted_text"][:2000]
+    content = state["extracted_text"][:_PROMPT_CHAR_BUDGET]
     prompt = f"Summarize the key findings of the following paper:\n\n{content}"
     try:
-        response = llm.invoke(prompt)
+        parts = []
+        for chunk in llm.stream(prompt):
+            if chunk.content:
+                # Marker prefix lets the frontend tell tokens from status lines.
+                callback(f"{TOKEN_PREFIX}{chunk.content}")
+                parts.append(chunk.content)
+        answer = "".join(parts)
         callback("✅ Summary generated")
-        paper = state["papers"][0]
+        # Attribute the summary to the paper whose PDF actually won the
+        # probe race, not blindly to the top-ranked result.
+        paper = state.get("pdf_paper") or state["papers"][0]
         return {
-            "answer": response.content,
+            "answer": answer,
+            "summaries": [answer],
             "title": paper.get("title", "No title"),
             "source": paper.get("openAccessPdf", {}).get("url") or paper.get("pdf_url", "No PDF URL")
         }
@@ -144,31 +447,77 @@ def summarize_text(state: AgentState, callback: Callable[[str], None] = lambda m
         callback("❌ LLM summarization failed")
         raise Exception("Failed to summarize text")
 
+# Prefix on streamed LLM token messages so SSE consumers can separate
+# them from status updates.
+TOKEN_PREFIX = "§TOK§"
+
+# How many papers to summarize in one batched LLM call. Ollama only runs
+# these in a single forward pass when OLLAMA_NUM_PARALLEL is at least this.
+_BATCH_SUMMARY_K = 5
+
 def summarize_abstract(state: AgentState, callback: Callable[[str], None] = lambda msg: None) -> dict:
-    abstract = state["papers"][0].get("description", "No abstract available.")
-    prompt = f"Summarize the following abstract:\n\n{abstract}"
-    response = llm.invoke(prompt)
+    papers = state["papers"][:_BATCH_SUMMARY_K]
+    prompts = [
+        f"Summarize the following abstract:\n\n{p.get('description', 'No abstract available.')}"
+        for p in papers
+    ]
+    responses = llm.batch(prompts)
+    summaries = [response.content for response in responses]
     paper = state["papers"][0]
-    callback("✅ Abstract summary generated")
+    callback(f"✅ Abstract summaries generated for {len(summaries)} papers")
     return {
-        "answer": response.content,
+        "answer": summaries[0],
+        "summaries": summaries,
         "title": paper.get("title", "No title"),
         "source": paper.get("openAccessPdf", {}).get("url") or paper.get("pdf_url", "No PDF URL")
     }
 
+# Per-invocation status callback; nodes read it instead of being
+# monkey-patched with a wrapped function on every run_agent call.
+_callback_var: ContextVar[Callable[[str], None]] = ContextVar("agent_callback", default=lambda msg: None)
+
+# Temp PDFs created during the current invocation. run_agent owns the list
+# and removes the files in its finally, so a crash in extract/summarize
+# can't leak them; appending works even if nodes run in a copied context.
+_temp_pdfs_var: ContextVar[Optional[List[str]]] = ContextVar("agent_temp_pdfs", default=None)
+
+def _node(fn):
+    def wrapped(state: AgentState) -> dict:
+        callback = _callback_var.get()
+        callback(f"🔄 {fn.__name__.replace('_', ' ').title()} started...")
+        result = fn(state, callback=callback)
+        callback(f"✅ {fn.__name__.replace('_', ' ').title()} completed.")
+        return result
+    return wrapped
+
 def build_graph():
     builder = StateGraph(AgentState)
-    builder.add_node("search", lambda s: search_papers(s))
-    builder.add_node("download", lambda s: download_pdf(s))
-    builder.add_node("extract", lambda s: extract_text(s))
-    builder.add_node("summarize", lambda s: summarize_text(s))
-    builder.add_node("summarize_abstract", lambda s: summarize_abstract(s))
+    builder.add_node("search", _node(search_papers))
+    builder.add_node("download", _node(download_pdf))
+    builder.add_node("extract", _node(extract_text))
+    builder.add_node("summarize", _node(summarize_text))
+    builder.add_node("summarize_abstract", _node(summarize_abstract))
 
     builder.set_entry_point("search")
-    builder.add_edge("search", "download")
+
+    def choose_after_search(state: AgentState) -> str:
+        # A substantial abstract already covers the 2000-char prompt budget;
+        # skip the download/extract stages entirely. FORCE_PDF=1 opts back
+        # into full-text summaries.
+        if os.getenv("FORCE_PDF") == "1":
+            return "download"
+        abstract = state["papers"][0].get("description") or ""
+        if len(abstract) >= _MIN_ABSTRACT_CHARS:
+            return "summarize_abstract"
+        return "download"
+
+    builder.add_conditional_edges("search", choose_after_search)
 
     def choose_next_node(state: AgentState) -> str:
-        return "extract" if "pdf_path" in state else "summarize_abstract"
+        # run_agent seeds pdf_path with "", so test truthiness, not presence:
+        # download_pdf returns {} on every no-PDF/too-large/error path and
+        # those must route to the abstract fallback.
+        return "extract" if state.get("pdf_path") else "summarize_abstract"
 
     builder.add_conditional_edges("download", choose_next_node)
     builder.add_edge("extract", "summarize")
@@ -177,6 +526,10 @@ def build_graph():
 
     return builder.compile()
 
+# The graph is deterministic — compile it once at import instead of on
+# every request.
+_GRAPH = build_graph()
+
 # LangChain-compatible callback handler
 class PrintHandler(BaseCallbackHandler):
     def __init__(self, send_update: Callable[[str], None]):
@@ -185,36 +538,56 @@ class PrintHandler(BaseCallbackHandler):
     def on_text(self, text: str, **kwargs) -> None:
         self.send_update(f"→ {text}")
 
+# Memoized final states keyed by normalized query, evicted oldest-first.
+# /analyze followed by /download on the same query hits this instead of
+# re-running the whole pipeline.
+_RESULT_CACHE_MAX = 128
+_result_cache: dict = {}
+_result_cache_lock = threading.Lock()
+
 # run_agent function
 def run_agent(query: str, callback: Callable[[str], None] = lambda msg: None):
+    cache_key = query.strip().lower()
+    with _result_cache_lock:
+        cached = _result_cache.get(cache_key)
+    if cached is not None:
+        callback("⚡ Reusing cached result for this query.")
+        callback("✅ Analysis complete.")
+        return cached
+
     callback("🔍 Starting search for relevant papers...")
 
     state: AgentState = {
         "query": query,
         "papers": [],
         "pdf_path": "",
+        "pdf_paper": {},
         "extracted_text": "",
-        "answer": ""
+        "answer": "",
+        "summaries": []
     }
 
-    callback("⚙️ Building LangGraph pipeline...")
-    graph = build_graph()
-
-    def with_callback(fn):
-        def wrapped(state):
-            callback(f"🔄 {fn.__name__.replace('_', ' ').title()} started...")
-            result = fn(state, callback=callback)
-            callback(f"✅ {fn.__name__.replace('_', ' ').title()} completed.")
-            return result
-        return wrapped
+    temp_pdfs: List[str] = []
+    token = _callback_var.set(callback)
+    pdfs_token = _temp_pdfs_var.set(temp_pdfs)
+    try:
+        final_state = _GRAPH.invoke(state)
+    finally:
+        _callback_var.reset(token)
+        _temp_pdfs_var.reset(pdfs_token)
+        # The extracted text lives in the state; the PDFs themselves are
+        # no longer needed, whether or not the graph completed.
+        for path in temp_pdfs:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
 
-    graph.nodes["search"].func = with_callback(search_papers)
-    graph.nodes["download"].func = with_callback(download_pdf)
-    graph.nodes["extract"].func = with_callback(extract_text)
-    graph.nodes["summarize"].func = with_callback(summarize_text)
-    graph.nodes["summarize_abstract"].func = with_callback(summarize_abstract)
+    with _result_cache_lock:
+        if len(_result_cache) >= _RESULT_CACHE_MAX:
+            _result_cache.pop(next(iter(_result_cache)))
+        _result_cache[cache_key] = final_state
 
-    final_state = graph.invoke(state)
     callback("✅ Analysis complete.")
     return final_state
 
@@ -1,8 +1,8 @@
 # main.py
 import os
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Request
 from pydantic import BaseModel
-from agent import run_agent
+from agent import run_agent, warm_up_llm
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import FileResponse, StreamingResponse
 from tempfile import NamedTemporaryFile
@@ -16,6 +16,10 @@ class AnswerResponse(BaseModel):
     query: str
     papers: list
     answer: str
+    summaries: list = []
+    # Title of the paper the answer was actually generated from (the PDF
+    # that won the probe race); empty on the abstract path.
+    title: str = ""
 
 app = FastAPI()
 
@@ -31,61 +35,92 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+async def startup():
+    # Warm the model in the background so startup isn't blocked on Ollama.
+    asyncio.get_running_loop().run_in_executor(None, warm_up_llm)
+
 @app.post("/analyze", response_model=AnswerResponse)
 async def analyze(req: QueryRequest):
     try:
-        state = run_agent(req.query)
+        # run_agent blocks for the whole pipeline; keep it off the event loop.
+        state = await asyncio.get_running_loop().run_in_executor(None, run_agent, req.query)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    return AnswerResponse(query=state["query"], papers=state["papers"], answer=state["answer"])
+    return AnswerResponse(
+        query=state["query"],
+        papers=state["papers"],
+        answer=state["answer"],
+        summaries=state.get("summaries", []),
+        title=(state.get("pdf_paper") or {}).get("title", ""),
+    )
 
 @app.post("/download")
-async def download_summary(req: QueryRequest):
+async def download_summary(req: QueryRequest, background_tasks: BackgroundTasks):
     try:
-        state = run_agent(req.query)
+        state = await asyncio.get_running_loop().run_in_executor(None, run_agent, req.query)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
     papers = state["papers"]
-    summary_text = f"Query: {req.query}\n\nSummary:\n{state.get('answer', 'No summary')}\n\n"
+    summaries = state.get("summaries", [])
+
+    # Write each piece straight to the temp file: linear in output size,
+    # no quadratic string concatenation or full in-memory copy.
+    temp_file = NamedTemporaryFile(delete=False, mode="w", suffix=".txt", encoding="utf-8")
+    temp_file.write(f"Query: {req.query}\n\nSummary:\n{state.get('answer', 'No summary')}\n\n")
 
     for idx, paper in enumerate(papers):
-        summary_text += f"\n--- Paper {idx + 1} ---\n"
-        summary_text += f"Title: {paper.get('title', 'N/A')}\n"
-        summary_text += f"Authors: {', '.join(a['name'] for a in paper.get('authors', []))}\n"
-        summary_text += f"Published: {paper.get('publishedDate', 'N/A')}\n"
-        summary_text += f"Citations: {paper.get('citationCount', 'N/A')}\n"
-        summary_text += f"Link: {paper.get('pdf_url') or paper.get('downloadUrl') or 'N/A'}\n"
-        summary_text += f"Abstract: {paper.get('abstract', '')[:500]}...\n"
+        temp_file.write(f"\n--- Paper {idx + 1} ---\n")
+        temp_file.write(f"Title: {paper.get('title', 'N/A')}\n")
+        temp_file.write(f"Authors: {', '.join(a.get('name', '') for a in paper.get('authors', []))}\n")
+        temp_file.write(f"Published: {paper.get('publishedDate', 'N/A')}\n")
+        temp_file.write(f"Citations: {paper.get('citationCount', 'N/A')}\n")
+        temp_file.write(f"Link: {paper.get('pdf_url') or paper.get('downloadUrl') or 'N/A'}\n")
+        if idx < len(summaries):
+            temp_file.write(f"Summary: {summaries[idx]}\n")
+        temp_file.write(f"Abstract: {paper.get('abstract', '')[:500]}...\n")
 
-    temp_file = NamedTemporaryFile(delete=False, mode="w", suffix=".txt", encoding="utf-8")
-    temp_file.write(summary_text)
     temp_file.close()
 
-    return FileResponse(temp_file.name, filename="summary.txt", media_type="text/plain")
+    # Remove the temp file after the response has been sent.
+    background_tasks.add_task(os.remove, temp_file.name)
+    return FileResponse(temp_file.name, filename="summary.txt", media_type="text/plain", background=background_tasks)
 
 @app.get("/stream")
 async def stream_status(query: str):
     async def event_generator():
         queue = asyncio.Queue()
+        loop = asyncio.get_running_loop()
 
         def callback(msg: str):
-            queue.put_nowait(msg)  # Safely enqueue message from thread
+            # asyncio.Queue is not thread-safe; hop onto the loop first.
+            loop.call_soon_threadsafe(queue.put_nowait, msg)
 
         # Running run_agent in a separate thread so it doesn't block event loop
-        loop = asyncio.get_event_loop()
-        loop.run_in_executor(None, run_agent, query, callback)
+        fut = loop.run_in_executor(None, run_agent, query, callback)
+
+        def on_done(f):
+            # If the agent died, unblock the consumer instead of hanging.
+            if not f.cancelled() and f.exception():
+                queue.put_nowait(f"❌ Agent failed: {f.exception()}")
+                queue.put_nowait("✅ Analysis complete.")
+
+        fut.add_done_callback(on_done)
 
         try:
             while True:
                 message = await queue.get()
-                yield f"data: {message}\n\n"
+                # One data: line per text line — SSE frames on newlines, and
+                # EventSource rejoins multiple data: lines with \n.
+                yield "".join(f"data: {line}\n" for line in message.split("\n")) + "\n"
                 # Optional log
                 print("[SSE] Sent:", message)
                 if message.strip() == "✅ Analysis complete.":
                     yield f"data: [DONE]\n\n"
                     break
         except asyncio.CancelledError:
+            fut.cancel()
             print("🚫 SSE connection closed by client.")
             yield f"data: [DONE]\n\n"
 
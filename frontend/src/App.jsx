@@ -1,6 +1,9 @@
 import React, { useState } from "react";
 import axios from "axios";
 
+// Matches TOKEN_PREFIX in backend/agent.py: streamed LLM tokens, not status lines.
+const TOKEN_PREFIX = "§TOK§";
+
 function formatDate(dateString) {
   const date = new Date(dateString);
   if (isNaN(date.getTime())) return "Data Not Available";
@@ -18,6 +21,7 @@ export default function App() {
   const [answer, setAnswer] = useState(null);
   const [error, setError] = useState(null);
   const [statusUpdates, setStatusUpdates] = useState([]);
+  const [streamedAnswer, setStreamedAnswer] = useState("");
 
   const handleSearch = async () => {
     if (!query.trim()) return;
@@ -25,6 +29,7 @@ export default function App() {
     setError(null);
     setAnswer(null);
     setStatusUpdates([]);
+    setStreamedAnswer("");
 
     const encodedQuery = encodeURIComponent(query.trim());
     const eventSource = new EventSource(`${import.meta.env.VITE_BACKEND_URL}/stream?query=${encodedQuery}`);
@@ -35,6 +40,8 @@ export default function App() {
       if (message === "[DONE]") {
         eventSource.close();
         fetchFinalAnswer();
+      } else if (message.startsWith(TOKEN_PREFIX)) {
+        setStreamedAnswer((prev) => prev + message.slice(TOKEN_PREFIX.length));
       } else {
         setStatusUpdates((prev) => [...prev, message]);
       }
@@ -125,6 +132,13 @@ const [downloading, setDownloading] = useState(false);
           </div>
         )}
 
+        {streamedAnswer && !answer && (
+          <div className="bg-indigo-50 border border-indigo-200 rounded-md p-4 text-sm">
+            <strong>🧠 Summary (streaming):</strong>
+            <p className="whitespace-pre-wrap mt-1 text-gray-800">{streamedAnswer}</p>
+          </div>
+        )}
+
         {answer && answer.papers?.length > 0 && (
           <div className="mt-8 flex flex-col lg:flex-row gap-6">
             {/* Left side - Paper List */}
@@ -173,6 +187,12 @@ const [downloading, setDownloading] = useState(false);
                     </p>
                   )}
 
+                  {answer.summaries?.[index] && (
+                    <p className="text-sm text-gray-800 whitespace-pre-wrap">
+                      <strong>🧠 LLM Summary:</strong> {answer.summaries[index]}
+                    </p>
+                  )}
+
                   {paper.openAccessPdf?.url ||
                   paper.pdf_url ||
                   paper.downloadUrl ||
@@ -200,7 +220,7 @@ const [downloading, setDownloading] = useState(false);
             {/* Right side - LLM Summary */}
             <div className="w-full lg:w-1/3 p-4 bg-white border rounded-lg shadow space-y-4 h-fit sticky top-4 self-start">
               <h3 className="text-xl font-bold text-indigo-600">
-                🧠 LLM Summary (Based on: {answer.papers[0]?.title || "First Paper"})
+                🧠 LLM Summary (Based on: {answer.title || answer.papers[0]?.title || "First Paper"})
               </h3>
               <p className="text-gray-900 whitespace-pre-wrap text-sm">{answer.answer}</p>
 